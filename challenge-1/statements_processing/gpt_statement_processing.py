@@ -1,14 +1,43 @@
 # Import Required Libraries
 import os
-import json
+import io
+import re
 import base64
+import asyncio
+import hashlib
+import logging
+import functools
+import threading
+import multiprocessing
+import httpx
+import orjson
+import diskcache
+import imagehash
+from PIL import Image, ImageOps
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+from openai import (
+    AsyncAzureOpenAI,
+    DefaultAsyncHttpxClient,
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    RateLimitError,
+)
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from aiolimiter import AsyncLimiter
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Statements files location
 STATEMENTS_IMAGE_FOLDER = '../../challenge-0/data/statements/'
 STATEMENTS_OUTPUT_LOCATION = '../output/gpt/'
@@ -19,29 +48,33 @@ AZURE_OPENAI_KEY = os.getenv('AZURE_OPENAI_KEY')
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME')
 AZURE_OPENAI_API_VERSION = os.getenv('AZURE_OPENAI_API_VERSION')
 
-# Initialize Azure OpenAI Client
-openai_client = AzureOpenAI(
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_key=AZURE_OPENAI_KEY,
-    api_version=AZURE_OPENAI_API_VERSION
+# Maximum number of claims processed concurrently
+MAX_CONCURRENT_CLAIMS = int(os.getenv('GPT_MAX_CONCURRENT_CLAIMS', '8'))
+
+# Number of processes hashing/downscaling/encoding images (CPU-bound, one per core)
+ENCODE_WORKERS = int(os.getenv('GPT_ENCODE_WORKERS', str(os.cpu_count() or 1)))
+
+# Maximum number of OpenAI requests per second (keeps bursts under RPM quota)
+OPENAI_RPS = int(os.getenv('OPENAI_RPS', '5'))
+openai_rate_limiter = AsyncLimiter(OPENAI_RPS, 1)
+
+# Statement file names: <claim_number>_<front|back>.<jpeg|jpg|png>
+STATEMENT_FILE_PATTERN = re.compile(
+    r'^([^_]+)_(front|back)\.(?:jpeg|jpg|png)$', re.IGNORECASE
 )
 
-print(f"✅ Configuration loaded:")
-print(f"   OpenAI API Version: {AZURE_OPENAI_API_VERSION}")
-print(f"   OpenAI Deployment: {AZURE_OPENAI_DEPLOYMENT_NAME}")
+# Images are downscaled to this long edge before upload; larger scans add tokens, not accuracy
+MAX_IMAGE_EDGE = int(os.getenv('GPT_MAX_IMAGE_EDGE', '2048'))
+JPEG_QUALITY = int(os.getenv('GPT_JPEG_QUALITY', '85'))
 
-# Function to encode image to base64
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+# Response cache for reruns: exact hits by content hash. Near-duplicate matching by
+# perceptual hash is opt-in (>= 0 enables it): different claims photographed on the same
+# form template can be a few bits apart, and a near match returns the other claim's data
+RESULTS_CACHE_LOCATION = os.path.join(STATEMENTS_OUTPUT_LOCATION, 'cache')
+PHASH_MAX_DISTANCE = int(os.getenv('GPT_PHASH_MAX_DISTANCE', '-1'))
 
-# Function to perform OCR using GPT-4.1-mini model
-def ocr_using_gpt4(front_image_path, back_image_path):
-    """Process front and back images using GPT-4.1-mini"""
-    front_base64 = encode_image(front_image_path)
-    back_base64 = encode_image(back_image_path)
-    
-    prompt = """Extract all information from these claim statement images (front and back).
+# Prompt sent with every claim; its digest is part of the cache key, so editing it invalidates cached results
+OCR_PROMPT = """Extract all information from these claim statement images (front and back).
     Return a structured JSON with all the information found including:
     - Claim number
     - Policy holder information
@@ -51,101 +84,441 @@ def ocr_using_gpt4(front_image_path, back_image_path):
     - Any other relevant information
     
     Combine information from both front and back images into a single comprehensive JSON object."""
-    
-    response = openai_client.chat.completions.create(
-        model=AZURE_OPENAI_DEPLOYMENT_NAME,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{front_base64}"
-                        }
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{back_base64}"
-                        }
-                    }
-                ]
-            }
-        ],
-        max_tokens=2000
+OCR_PROMPT_DIGEST = hashlib.sha256(OCR_PROMPT.encode()).digest()
+
+# Content hash for exact cache hits: OpenSSL SHA-256 (SHA-NI accelerated on x86) by default,
+# or BLAKE3 (pip install blake3) on platforms without SHA extensions, e.g. ARM runners
+CACHE_HASH_ALGORITHM = os.getenv('GPT_CACHE_HASH_ALGORITHM', 'sha256').lower()
+if CACHE_HASH_ALGORITHM == 'blake3':
+    from blake3 import blake3 as cache_hasher
+else:
+    CACHE_HASH_ALGORITHM = 'sha256'
+    cache_hasher = hashlib.sha256
+
+# Keep-alive connection pool sized to the claim concurrency so connections are reused
+OPENAI_CONNECTION_POOL_SIZE = int(
+    os.getenv('OPENAI_CONNECTION_POOL_SIZE', str(2 * MAX_CONCURRENT_CLAIMS))
+)
+
+# The encode pool's worker processes re-import this module, so the cache and the client
+# are created on first use in the main process rather than at import time
+@functools.cache
+def get_results_cache():
+    return diskcache.Cache(RESULTS_CACHE_LOCATION)
+
+# Initialize Azure OpenAI Client
+@functools.cache
+def get_openai_client():
+    return AsyncAzureOpenAI(
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        api_key=AZURE_OPENAI_KEY,
+        api_version=AZURE_OPENAI_API_VERSION,
+        # ocr_using_gpt4's tenacity policy is the only retry layer
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_CONNECTION_POOL_SIZE,
+                max_keepalive_connections=OPENAI_CONNECTION_POOL_SIZE,
+                keepalive_expiry=60,
+            )
+        ),
     )
+
+# Function to read raw image bytes
+def read_image_bytes(image_path):
+    with open(image_path, "rb") as image_file:
+        return image_file.read()
+
+# Function to downscale an image so its long edge is at most MAX_IMAGE_EDGE
+def downscale_image(image_bytes):
+    """Return JPEG bytes capped at MAX_IMAGE_EDGE, or the original bytes if already small enough"""
+    image = Image.open(io.BytesIO(image_bytes))
+    if max(image.size) <= MAX_IMAGE_EDGE:
+        return image_bytes
+
+    # Re-encoding drops EXIF, so apply the orientation tag first to keep phone photos upright
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((MAX_IMAGE_EDGE, MAX_IMAGE_EDGE), Image.LANCZOS)
+    output = io.BytesIO()
+    image.convert("RGB").save(output, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
+# Function to downscale and base64-encode an image for the GPT request
+def encode_image(image_bytes):
+    return base64.b64encode(downscale_image(image_bytes)).decode('utf-8')
+
+# Function to compute the exact cache key of a claim
+def compute_content_key(front_bytes, back_bytes):
+    """Return the hash of the deployment, the prompt and the front+back bytes"""
+    # Results depend on the deployment and prompt too, so a change to either misses the cache
+    hasher = cache_hasher()
+    hasher.update((AZURE_OPENAI_DEPLOYMENT_NAME or "").encode())
+    hasher.update(b"\x00")
+    hasher.update(OCR_PROMPT_DIGEST)
+    # Feed both images incrementally instead of hashing a concatenated copy
+    hasher.update(front_bytes)
+    hasher.update(back_bytes)
+    return hasher.hexdigest()
+
+# Function to compute the perceptual cache key of a claim (for near-duplicate matching)
+def compute_perceptual_key(front_bytes, back_bytes):
+    """Return the perceptual hashes of the front and back images as hex strings"""
+    return tuple(
+        str(imagehash.phash(Image.open(io.BytesIO(image_bytes))))
+        for image_bytes in (front_bytes, back_bytes)
+    )
+
+# Decoded perceptual hashes of cached claims, built from the cache once per run
+phash_index = None
+phash_index_lock = threading.Lock()
+
+# Function to get the in-memory index of (front phash, back phash, content key) entries
+def get_phash_index():
+    global phash_index
+    with phash_index_lock:
+        if phash_index is None:
+            phash_index = []
+            results_cache = get_results_cache()
+            for key in results_cache.iterkeys():
+                if key[0] != "phash":
+                    continue
+                content_key = results_cache.get(key)
+                if content_key is not None:
+                    phash_index.append(
+                        (imagehash.hex_to_hash(key[1]), imagehash.hex_to_hash(key[2]), content_key)
+                    )
+    return phash_index
+
+# Function to look up a previously computed result for the same (or, if enabled, a near-identical) claim
+def get_cached_result(content_key, perceptual_key):
+    """Return the cached OCR result, or None on a cache miss (blocking; run off the event loop)"""
+    results_cache = get_results_cache()
+    result = results_cache.get((CACHE_HASH_ALGORITHM, content_key))
+    if result is not None or perceptual_key is None:
+        return result
+
+    # Near match: both sides within PHASH_MAX_DISTANCE bits (Hamming distance)
+    front_hash, back_hash = (imagehash.hex_to_hash(h) for h in perceptual_key)
+    for cached_front, cached_back, cached_content_key in get_phash_index():
+        if max(front_hash - cached_front, back_hash - cached_back) <= PHASH_MAX_DISTANCE:
+            result = results_cache.get((CACHE_HASH_ALGORITHM, cached_content_key))
+            if result is not None:
+                return result
+    return None
+
+# Function to store an OCR result under its content key (and perceptual key, if enabled)
+def set_cached_result(content_key, perceptual_key, result):
+    """Blocking SQLite write; run off the event loop"""
+    results_cache = get_results_cache()
+    results_cache.set((CACHE_HASH_ALGORITHM, content_key), result)
+    if perceptual_key is None:
+        return
+    results_cache.set(("phash", *perceptual_key), content_key)
+    with phash_index_lock:
+        if phash_index is not None:
+            phash_index.append(
+                (*(imagehash.hex_to_hash(h) for h in perceptual_key), content_key)
+            )
+
+# Function to decide whether a failed OpenAI call is worth retrying
+def is_retryable_error(exc):
+    """Return True for rate limiting, quota and transient connection/server errors"""
+    if isinstance(exc, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(exc, APIStatusError):
+        if exc.status_code == 429 or exc.status_code >= 500:
+            return True
+        message = str(exc).lower()
+        return "rate limit" in message or "quota" in message
+    return False
+
+# Function to log each retry attempt
+def log_retry(retry_state):
+    exc = retry_state.outcome.exception()
+    logger.warning(
+        f"GPT-4.1-mini call failed (attempt {retry_state.attempt_number}): {exc}. "
+        f"Retrying in {retry_state.next_action.sleep:.1f}s..."
+    )
+
+# Function to perform OCR using GPT-4.1-mini model
+@retry(
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception(is_retryable_error),
+    before_sleep=log_retry,
+    reraise=True,
+)
+async def ocr_using_gpt4(front_base64, back_base64):
+    """Process base64-encoded front and back images using GPT-4.1-mini"""
+    # Every attempt (including retries) waits for a rate limiter slot; the client makes no
+    # retries of its own (max_retries=0), so each slot covers exactly one request
+    async with openai_rate_limiter:
+        response = await get_openai_client().chat.completions.create(
+            model=AZURE_OPENAI_DEPLOYMENT_NAME,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": OCR_PROMPT},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/jpeg;base64,{front_base64}"
+                            }
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/jpeg;base64,{back_base64}"
+                            }
+                        }
+                    ]
+                }
+            ],
+            max_tokens=2000,
+            # JSON mode: the model must emit a single valid JSON object, no markdown fences
+            response_format={"type": "json_object"}
+        )
     
     return response.choices[0].message.content
 
+# Function to lazily list local statement image files
+def iter_image_files(folder):
+    """Yield image file names from folder as the directory is scanned"""
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith((".jpeg", ".jpg", ".png")):
+                yield entry.name
+
 # Function to group claims by number
 def group_claims_by_number(file_list):
-    """Group front and back images by claim number from local files"""
-    claims = defaultdict(dict)
+    """Yield (claim_number, images) as soon as both front and back of a claim have been seen"""
+    pending_claims = defaultdict(dict)
 
     for file_name in file_list:
         # Extract claim number and side (front/back)
         # Example: crash1_front.jpeg -> claim_number='crash1', side='front'
         base_name = os.path.basename(file_name)
-        name_parts = (
-            base_name.replace('.jpeg', '')
-            .replace('.jpg', '')
-            .replace('.png', '')
-            .split('_')
+        match = STATEMENT_FILE_PATTERN.match(base_name)
+        if match:
+            claim_number, side = match.groups()
+            images = pending_claims[claim_number]
+            images[side.lower()] = base_name
+            if 'front' in images and 'back' in images:
+                yield claim_number, pending_claims.pop(claim_number)
+
+# Pipeline worker: pull items from a stage queue and hand them to the stage handler
+async def pipeline_worker(in_queue, handle, failed_claims):
+    """Process items from in_queue until cancelled; a failing claim is recorded, not fatal"""
+    while True:
+        item = await in_queue.get()
+        try:
+            await handle(*item)
+        except Exception as e:
+            logger.error(f"Failed to process {item[0]}: {e}")
+            failed_claims[item[0]] = str(e)
+        finally:
+            in_queue.task_done()
+
+# Process all claims through a read -> encode -> OCR pipeline
+async def process_claims_pipeline(grouped_claims, results_file, process_pool):
+    """Process (claim_number, images) pairs with bounded queues between the pipeline stages.
+
+    Each stage saturates a different resource (disk, CPU, remote model), so while one
+    claim waits on GPT-4.1-mini the next claims are already being read and encoded.
+    Each completed claim is appended to results_file (JSON Lines) immediately.
+    CPU-bound encoding runs in process_pool, which must be started before any threads.
+    Returns (number of claims completed in this run, {claim_number: error} for failed claims).
+    """
+    read_queue = asyncio.Queue(maxsize=2 * MAX_CONCURRENT_CLAIMS)
+    encode_queue = asyncio.Queue(maxsize=2 * MAX_CONCURRENT_CLAIMS)
+    ocr_queue = asyncio.Queue(maxsize=2 * MAX_CONCURRENT_CLAIMS)
+    completed_count = 0
+    failed_claims = {}
+
+    # Persist a completed claim right away so an interrupted run can resume
+    def save_result(claim_number, result):
+        nonlocal completed_count
+        results_file.write(orjson.dumps({"claim": claim_number, "result": result}) + b"\n")
+        results_file.flush()
+        completed_count += 1
+
+    # Stage 1: read each image once; the same bytes feed the cache keys and the GPT call
+    async def read_claim(claim_number, images):
+        print(f"Processing {claim_number} with GPT-4.1-mini...")
+
+        # Build full paths for front and back images from local folder
+        front_path = os.path.join(STATEMENTS_IMAGE_FOLDER, images["front"])
+        back_path = os.path.join(STATEMENTS_IMAGE_FOLDER, images["back"])
+
+        front_bytes, back_bytes = await asyncio.gather(
+            asyncio.to_thread(read_image_bytes, front_path),
+            asyncio.to_thread(read_image_bytes, back_path),
         )
-        if len(name_parts) >= 2:
-            claim_number = name_parts[0]
-            side = name_parts[1]
-            claims[claim_number][side] = base_name
+        await encode_queue.put((claim_number, front_bytes, back_bytes))
+
+    # Stage 2: hash for the cache lookup, then downscale and base64-encode on a cache miss.
+    # The content hash releases the GIL and costs less than pickling both images to another
+    # process, so it runs on a thread; phash and encoding are CPU-bound Python/Pillow work
+    # and run in the process pool.
+    async def encode_claim(claim_number, front_bytes, back_bytes):
+        loop = asyncio.get_running_loop()
+        content_key = await asyncio.to_thread(compute_content_key, front_bytes, back_bytes)
+        perceptual_key = None
+        if PHASH_MAX_DISTANCE >= 0:
+            perceptual_key = await loop.run_in_executor(
+                process_pool, compute_perceptual_key, front_bytes, back_bytes
+            )
+
+        # Skip the GPT call entirely if this claim (or a near-duplicate) was already processed
+        result = await asyncio.to_thread(get_cached_result, content_key, perceptual_key)
+        if result is not None:
+            save_result(claim_number, result)
+            print(f"✓ Completed {claim_number} (cached)")
+            return
+
+        front_base64, back_base64 = await asyncio.gather(
+            loop.run_in_executor(process_pool, encode_image, front_bytes),
+            loop.run_in_executor(process_pool, encode_image, back_bytes),
+        )
+        await ocr_queue.put(
+            (claim_number, front_base64, back_base64, content_key, perceptual_key)
+        )
+
+    # Stage 3: perform OCR on both images together
+    async def ocr_claim(claim_number, front_base64, back_base64, content_key, perceptual_key):
+        result = await ocr_using_gpt4(front_base64, back_base64)
+        await asyncio.to_thread(set_cached_result, content_key, perceptual_key, result)
+        save_result(claim_number, result)
+        print(f"✓ Completed {claim_number}")
+
+    # The task group owns every worker: an unexpected crash in one cancels the rest
+    # instead of leaving the queues hanging, while per-claim errors are only recorded
+    async with asyncio.TaskGroup() as task_group:
+        workers = (
+            [task_group.create_task(pipeline_worker(read_queue, read_claim, failed_claims))
+             for _ in range(MAX_CONCURRENT_CLAIMS)]
+            + [task_group.create_task(pipeline_worker(encode_queue, encode_claim, failed_claims))
+               for _ in range(ENCODE_WORKERS)]
+            + [task_group.create_task(pipeline_worker(ocr_queue, ocr_claim, failed_claims))
+               for _ in range(MAX_CONCURRENT_CLAIMS)]
+        )
+
+        for claim_number, images in grouped_claims:
+            await read_queue.put((claim_number, images))
 
-    return claims
+        # Drain the stages in order, then stop the idle workers
+        await read_queue.join()
+        await encode_queue.join()
+        await ocr_queue.join()
+        for worker in workers:
+            worker.cancel()
+
+    return completed_count, failed_claims
+
+# Function to load claim results saved by previous (possibly interrupted) runs
+def load_saved_results(results_path):
+    """Return {claim_number: result} from a JSON Lines results file, if it exists"""
+    saved_results = {}
+    if not os.path.exists(results_path):
+        return saved_results
+
+    with open(results_path, 'rb') as f:
+        for line in f:
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # Partially written last line of an interrupted run
+                continue
+            saved_results[record["claim"]] = record["result"]
+    return saved_results
+
+# Function to drop a partially written last line so appended records start on a fresh line
+def truncate_partial_line(results_path):
+    """Truncate a JSON Lines file after its last newline (no-op if it ends with one)"""
+    if not os.path.exists(results_path):
+        return
+
+    with open(results_path, 'r+b') as f:
+        end = position = f.seek(0, os.SEEK_END)
+        # Scan backwards in blocks; only the tail of the file is normally read
+        while position > 0:
+            block_start = max(0, position - 65536)
+            f.seek(block_start)
+            newline = f.read(position - block_start).rfind(b"\n")
+            if newline != -1:
+                position = block_start + newline + 1
+                break
+            position = block_start
+        if position < end:
+            f.truncate(position)
 
 # Main processing function
 def process_statements_with_gpt4():
     """Process all statement images from local folder using GPT-4.1-mini Model"""
-       
-
-    # List all local image files and group them by claim number
-    image_files = [
-        f
-        for f in os.listdir(STATEMENTS_IMAGE_FOLDER)
-        if f.lower().endswith((".jpeg", ".jpg", ".png"))
-    ]
-    grouped_claims = group_claims_by_number(image_files)
-    
-    # Store results
-    gpt4_results = {}
+    print(f"✅ Configuration loaded:")
+    print(f"   OpenAI API Version: {AZURE_OPENAI_API_VERSION}")
+    print(f"   OpenAI Deployment: {AZURE_OPENAI_DEPLOYMENT_NAME}")
+    print(f"   Max concurrent claims: {MAX_CONCURRENT_CLAIMS}")
+    print(f"   OpenAI requests per second: {OPENAI_RPS}")
+
+    # Ensure output directory exists; completed claims are appended here as they finish
+    os.makedirs(STATEMENTS_OUTPUT_LOCATION, exist_ok=True)
+    results_path = os.path.join(
+        STATEMENTS_OUTPUT_LOCATION, 'gpt4_statement_results.jsonl'
+    )
+
+    # An interrupted run can leave a half-written last record; appending onto it would
+    # merge it with the first new record into one undecodable line
+    truncate_partial_line(results_path)
+
+    # Skip claims already completed by a previous run (delete the .jsonl file to reprocess)
+    completed_claims = load_saved_results(results_path).keys()
+    if completed_claims:
+        print(f"⏭️  Skipping {len(completed_claims)} claims already in {results_path}")
+
+    # Stream local image files grouped by claim number; each complete claim
+    # enters the pipeline while the rest of the folder is still being scanned
+    grouped_claims = (
+        (claim_number, images)
+        for claim_number, images in group_claims_by_number(
+            iter_image_files(STATEMENTS_IMAGE_FOLDER)
+        )
+        if claim_number not in completed_claims
+    )
     
-    # Process each claim (front + back together)
-    for claim_number, images in grouped_claims.items():
-        if 'front' in images and 'back' in images:
-            print(f"Processing {claim_number} with GPT-4.1-mini...")
-
-            # Build full paths for front and back images from local folder
-            front_path = os.path.join(STATEMENTS_IMAGE_FOLDER, images["front"])
-            back_path = os.path.join(STATEMENTS_IMAGE_FOLDER, images["back"])
-
-            # Perform OCR on both images together
-            result = ocr_using_gpt4(front_path, back_path)
-            gpt4_results[claim_number] = result
-            
-            print(f"✓ Completed {claim_number}")
+    # Process each claim (front + back together) through the concurrent pipeline
+    # The pool is created before the pipeline starts any threads, and uses "spawn" so
+    # workers never inherit a forked copy of a lock held by another thread
+    process_pool = ProcessPoolExecutor(
+        max_workers=ENCODE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+    with process_pool, open(results_path, 'ab') as results_file:
+        processed_count, failed_claims = asyncio.run(
+            process_claims_pipeline(grouped_claims, results_file, process_pool)
+        )
     
-    print(f"\n✅ Processed {len(gpt4_results)} claims with GPT-4.1-mini")
+    print(f"\n✅ Processed {processed_count} claims with GPT-4.1-mini")
+    logger.info(
+        f"Succeeded {processed_count} / {processed_count + len(failed_claims)} claims"
+    )
 
-    # Ensure output directory exists and save results to file there
-    os.makedirs(STATEMENTS_OUTPUT_LOCATION, exist_ok=True)
+    # Aggregate all saved claims into a single JSON document; failed claims are reported
+    # here but not persisted to the .jsonl, so the next run retries them
+    gpt4_results = load_saved_results(results_path)
+    for claim_number, error in failed_claims.items():
+        gpt4_results[claim_number] = {"error": error}
     output_file = os.path.join(
         STATEMENTS_OUTPUT_LOCATION, 'gpt4_statement_results.json'
     )
-    with open(output_file, 'w') as f:
-        json.dump(gpt4_results, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(gpt4_results, option=orjson.OPT_INDENT_2))
 
     print(f"💾 Results saved to {output_file}")
     
     return gpt4_results
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     results = process_statements_with_gpt4()
     print(f"\n📊 Total claims processed: {len(results)}")
@@ -0,0 +1,43 @@
+import orjson
+
+from gpt_statement_processing import load_saved_results, truncate_partial_line
+
+
+def append_record(results_path, claim_number, result):
+    with open(results_path, 'ab') as results_file:
+        results_file.write(orjson.dumps({"claim": claim_number, "result": result}) + b"\n")
+
+
+def test_resume_after_partial_line(tmp_path):
+    """A record appended after an interrupted run is not merged into the partial line"""
+    results_path = tmp_path / "results.jsonl"
+    append_record(results_path, "CL-001", {"claim_number": "CL-001"})
+    with open(results_path, 'ab') as results_file:
+        results_file.write(b'{"claim": "CL-002", "resu')
+
+    truncate_partial_line(results_path)
+    append_record(results_path, "CL-003", {"claim_number": "CL-003"})
+
+    assert load_saved_results(results_path) == {
+        "CL-001": {"claim_number": "CL-001"},
+        "CL-003": {"claim_number": "CL-003"},
+    }
+
+
+def test_truncate_keeps_complete_file(tmp_path):
+    results_path = tmp_path / "results.jsonl"
+    append_record(results_path, "CL-001", {"claim_number": "CL-001"})
+    contents = results_path.read_bytes()
+
+    truncate_partial_line(results_path)
+
+    assert results_path.read_bytes() == contents
+
+
+def test_truncate_partial_only_line(tmp_path):
+    results_path = tmp_path / "results.jsonl"
+    results_path.write_bytes(b'{"claim": "CL-001"')
+
+    truncate_partial_line(results_path)
+
+    assert results_path.read_bytes() == b""
@@ -13,15 +13,31 @@ Example with OCR JSON output:
 """
 import os
 import sys
-import json
+import asyncio
+import atexit
+import hashlib
 import logging
+import tempfile
+import threading
+import time
+import httpx
+import orjson
+import diskcache
 from datetime import datetime
 from dotenv import load_dotenv
+from openai import APIConnectionError, APIError, APIStatusError, APITimeoutError, RateLimitError
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 # Azure AI Foundry SDK
 from azure.ai.projects import AIProjectClient
+from azure.core.exceptions import HttpResponseError
 from azure.ai.projects.models import PromptAgentDefinition
-from azure.identity import DefaultAzureCredential
+from azure.identity import (
+    AzureCliCredential,
+    ChainedTokenCredential,
+    DefaultAzureCredential,
+    ManagedIdentityCredential,
+)
 
 # Load environment variables
 load_dotenv(override=True)
@@ -34,155 +50,612 @@ logger = logging.getLogger(__name__)
 project_endpoint = os.environ.get("AI_FOUNDRY_PROJECT_ENDPOINT")
 # Use GPT-4o-mini for this agent
 model_deployment_name = os.environ.get("MODEL_DEPLOYMENT_NAME", "gpt-4o-mini")
+# Optional smaller deployment tried first; low-confidence or unparsable answers fall back
+# to model_deployment_name. Leave unset to always use the main model.
+fast_model_deployment_name = os.environ.get("EXTRACTION_MODEL_FAST") or None
+# On-disk cache of extraction results keyed by OCR text; set to an empty string to disable
+extraction_cache_dir = os.environ.get("EXTRACTION_CACHE_DIR", "/tmp/claims_cache")
 
+# Token scope requested by the AI Project Client and its OpenAI client
+_TOKEN_SCOPE = "https://ai.azure.com/.default"
 
-def get_agent_instructions() -> str:
+
+def _create_credential():
     """
-    Generate agent instructions for OCR text extraction from JPEG pictures.
+    Create the process-wide Azure credential.
+    
+    When a managed identity endpoint is present (Azure-hosted containers), a
+    short managed identity -> Azure CLI chain is used so the slower probes of
+    DefaultAzureCredential are skipped; otherwise the default chain applies.
     
     Returns:
-        Agent instruction string for pure OCR extraction
+        Azure token credential
     """
-    return """You are an expert OCR text extraction assistant specialized in extracting and structuring text content from JPEG images.
-
-**Your Task**:
-Extract all visible text from the provided JPEG image and structure it into a clean, organized JSON format. Focus solely on text extraction - do not analyze or describe any visual elements, objects, or non-text content in the image.
-
-**JSON Output Structure**:
-{
-  "document_type": "form | letter | receipt | invoice | certificate | report | handwritten | mixed | other",
-  "extracted_text": {
-    "raw_text": "Complete extracted text preserving original layout where possible",
-    "text_blocks": [
-      {
-        "block_id": 1,
-        "content": "Text content of this block",
-        "text_type": "printed | handwritten | mixed"
-      }
-    ],
-    "structured_fields": {
-      "titles": ["Any document titles or headers"],
-      "dates": ["Extracted dates in original format"],
-      "names": ["Person or organization names found"],
-      "addresses": ["Any addresses found"],
-      "phone_numbers": ["Phone numbers found"],
-      "email_addresses": ["Email addresses found"],
-      "reference_numbers": ["Document numbers, IDs, or reference codes"],
-      "amounts": ["Monetary amounts or numeric values with context"]
-    }
-  },
-  "text_quality": {
-    "overall_legibility": "high | medium | low",
-    "issues": ["List any text that was unclear or partially readable"]
-  },
-  "confidence": "high | medium | low",
-  "extraction_notes": "Notes about the extraction quality or any ambiguities"
+    if os.environ.get("IDENTITY_ENDPOINT") or os.environ.get("MSI_ENDPOINT"):
+        return ChainedTokenCredential(
+            ManagedIdentityCredential(client_id=os.environ.get("AZURE_CLIENT_ID")),
+            AzureCliCredential(),
+        )
+    return DefaultAzureCredential()
+
+
+def _prefetch_token() -> None:
+    """Acquire the first access token so the first request doesn't pay for it."""
+    try:
+        _credential.get_token(_TOKEN_SCOPE)
+    except Exception as e:
+        logger.warning(f"Credential prefetch failed (will retry on first request): {e}")
+
+
+# Shared credential and lazily created project client, reused across calls so the
+# credential chain and token cache are resolved once per process. The first token
+# is fetched in the background at import, overlapping with the caller's startup.
+_credential = _create_credential()
+threading.Thread(target=_prefetch_token, name="credential-prefetch", daemon=True).start()
+_project_client = None
+_project_client_lock = threading.Lock()
+
+# One pooled HTTP transport for all model calls, so keep-alive connections are reused
+# instead of paying a TCP/TLS handshake per request
+_http_client = httpx.Client(
+    timeout=httpx.Timeout(60.0, connect=5.0),
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+)
+atexit.register(_http_client.close)
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+# Hard cap on generated tokens; a complete answer for the fixed schema needs ~600-1200
+MAX_OUTPUT_TOKENS = int(os.environ.get("EXTRACTION_MAX_OUTPUT_TOKENS", "1500"))
+
+# Offline Batch API path: deployment used for batch jobs (must support batch) and poll interval
+batch_model_deployment_name = os.environ.get("BATCH_MODEL_DEPLOYMENT_NAME", model_deployment_name)
+BATCH_POLL_INTERVAL = float(os.environ.get("EXTRACTION_BATCH_POLL_SECONDS", "30"))
+
+# Agent versions created in this process, keyed by (model deployment, instructions hash)
+_agent_cache = {}
+_agent_cache_lock = threading.Lock()
+
+# Extraction results by content hash; the agent is near-deterministic (temperature 0.1),
+# so identical OCR text with identical instructions yields the same structure
+_response_cache = diskcache.Cache(extraction_cache_dir) if extraction_cache_dir else None
+
+
+def _get_project_client() -> AIProjectClient:
+    """
+    Get the process-wide AI Project Client, creating it on first use.
+    
+    Returns:
+        Shared AIProjectClient instance
+    """
+    global _project_client
+    if _project_client is None:
+        with _project_client_lock:
+            if _project_client is None:
+                logger.info("Creating AI Project Client...")
+                _project_client = AIProjectClient(
+                    endpoint=project_endpoint,
+                    credential=_credential,
+                )
+                atexit.register(_project_client.close)
+    return _project_client
+
+
+# Shape of the agent output; "a|b" strings list the allowed values for a field.
+# extracted_text.raw_text is not requested from the model (it would echo the whole
+# input back as output tokens) and is filled in locally from the OCR text instead.
+_OUTPUT_SCHEMA = {
+    "document_type": "form|letter|receipt|invoice|certificate|report|handwritten|mixed|other",
+    "extracted_text": {
+        "text_blocks": [{"block_id": 1, "content": "", "text_type": "printed|handwritten|mixed"}],
+        "structured_fields": {
+            field: [] for field in ("titles", "dates", "names", "addresses", "phone_numbers",
+                                    "email_addresses", "reference_numbers", "amounts")
+        },
+    },
+    "text_quality": {"overall_legibility": "high|medium|low", "issues": []},
+    "confidence": "high|medium|low",
+    "extraction_notes": "",
+}
+
+# Compact (no whitespace) encoding of the schema, computed once at import
+_OUTPUT_SCHEMA_JSON = orjson.dumps(_OUTPUT_SCHEMA).decode()
+
+# Worked input/output pair appended for the fast model to recover accuracy
+_FEW_SHOT_INPUT = "INVOICE\nRef: INV-4471\nDate: 03/02/2024\nBill to: Jane Doe\nTotal due: $120.00"
+_FEW_SHOT_OUTPUT = {
+    "document_type": "invoice",
+    "extracted_text": {
+        "text_blocks": [
+            {"block_id": 1, "content": "INVOICE", "text_type": "printed"},
+            {"block_id": 2, "content": "Ref: INV-4471\nDate: 03/02/2024", "text_type": "printed"},
+            {"block_id": 3, "content": "Bill to: Jane Doe\nTotal due: $120.00", "text_type": "printed"},
+        ],
+        "structured_fields": {
+            "titles": ["INVOICE"],
+            "dates": ["03/02/2024"],
+            "names": ["Jane Doe"],
+            "addresses": None,
+            "phone_numbers": None,
+            "email_addresses": None,
+            "reference_numbers": ["INV-4471"],
+            "amounts": ["Total due: $120.00"],
+        },
+    },
+    "text_quality": {"overall_legibility": "high", "issues": []},
+    "confidence": "high",
+    "extraction_notes": "",
+}
+_FEW_SHOT_EXAMPLE = (
+    f"\nEXAMPLE INPUT: {orjson.dumps(_FEW_SHOT_INPUT).decode()}"
+    f"\nEXAMPLE OUTPUT: {orjson.dumps(_FEW_SHOT_OUTPUT).decode()}"
+)
+
+
+# Agent instructions, built once at import. Kept deliberately terse: they are
+# prefilled on every call, so every token here adds latency and cost.
+AGENT_INSTRUCTIONS: str = f"""Structure OCR text from a scanned document into ONE JSON object with this shape.
+The user message is only the OCR text, between ---OCR TEXT START--- and ---OCR TEXT END---.
+SHAPE: {_OUTPUT_SCHEMA_JSON}
+Rules:
+- Copy ALL text exactly as written (spelling, punctuation); never skip text.
+- text_blocks in reading order (top-bottom, left-right).
+- structured_fields: categorize found values; null when none found.
+- List unclear/partial text in text_quality.issues; set confidence from clarity and completeness.
+- Text only: ignore images, graphics, logos.
+- Output valid JSON only. No markdown, no commentary."""
+AGENT_INSTRUCTIONS_FEW_SHOT: str = AGENT_INSTRUCTIONS + _FEW_SHOT_EXAMPLE
+
+# Encoded forms and digests for cache keys, so hashing never re-encodes the text
+AGENT_INSTRUCTIONS_BYTES = AGENT_INSTRUCTIONS.encode()
+_INSTRUCTIONS_DIGESTS = {
+    False: hashlib.sha256(AGENT_INSTRUCTIONS_BYTES).hexdigest(),
+    True: hashlib.sha256(AGENT_INSTRUCTIONS_FEW_SHOT.encode()).hexdigest(),
+}
+
+AGENT_NAME = "OCRTextExtractionAgent"
+FAST_AGENT_NAME = "OCRTextExtractionAgentFast"
+
+# Stable routing hint per agent, derived from its instructions: requests with the same
+# key are sent to the same replica, which already holds the instruction prefix in its
+# KV cache. A change to the instructions yields a new key.
+_PROMPT_CACHE_KEYS = {
+    AGENT_NAME: _INSTRUCTIONS_DIGESTS[False][:32],
+    FAST_AGENT_NAME: _INSTRUCTIONS_DIGESTS[True][:32],
 }
 
-**Processing Rules**:
-1. Extract ALL visible text from the image - do not skip any text content
-2. Preserve the original text exactly as it appears (spelling, formatting, punctuation)
-3. Organize text blocks in reading order (top to bottom, left to right)
-4. Identify and categorize structured fields (dates, names, numbers, etc.)
-5. Note any text that is unclear, partially visible, or difficult to read
-6. Use null for structured fields where no relevant text is found
-7. Set confidence level based on text clarity and extraction completeness
-8. Focus ONLY on text - ignore any images, graphics, logos, or visual elements
-9. Return ONLY valid JSON, no additional commentary
 
-**Important**: 
-- Your entire response must be valid JSON that can be parsed
-- Do not include any text before or after the JSON object
-- Do not describe or analyze any pictures, photos, or visual content - extract text only"""
+def _get_openai_client(project_client: AIProjectClient = None):
+    """
+    Get an OpenAI client for agent responses that uses the shared HTTP transport.
+    
+    The client for the shared project client is created once and reused; other
+    project clients get a new OpenAI client on the same transport. SDK-level
+    retries are disabled because _call_agent's tenacity policy retries instead.
+    
+    Args:
+        project_client: Optional AIProjectClient (defaults to the shared one)
+        
+    Returns:
+        OpenAI client bound to the pooled HTTP client
+    """
+    global _openai_client
+    if project_client is not None and project_client is not _project_client:
+        return project_client.get_openai_client(http_client=_http_client, max_retries=0)
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                _openai_client = _get_project_client().get_openai_client(
+                    http_client=_http_client, max_retries=0
+                )
+    return _openai_client
 
 
-def structure_ocr_to_json(ocr_text: str, source_file: str = None, project_client=None, agent=None) -> dict:
+def get_agent_instructions(few_shot: bool = False) -> str:
     """
-    Convert OCR text into structured JSON format using GPT-4o-mini agent.
+    Get the agent instructions for OCR text extraction from JPEG pictures.
+    
+    Args:
+        few_shot: Include a worked example (used for the smaller fast model)
+    
+    Returns:
+        Agent instruction string for pure OCR extraction
+    """
+    return AGENT_INSTRUCTIONS_FEW_SHOT if few_shot else AGENT_INSTRUCTIONS
+
+
+def _now_iso() -> str:
+    """Current local time as an ISO 8601 string, for metadata timestamps."""
+    return datetime.now().isoformat()
+
+
+def warm_up_agent() -> None:
+    """
+    Create the shared AI Project Client and extraction agents ahead of the first request.
+    
+    Lets callers hide agent setup latency behind other work (e.g. OCR).
+    """
+    project_client = _get_project_client()
+    if fast_model_deployment_name:
+        _get_or_create_agent(project_client, fast_model_deployment_name)
+    _get_or_create_agent(project_client)
+
+
+def build_user_query(ocr_text: str) -> str:
+    """
+    Build the user message for the extraction agent.
+    
+    The message carries only the OCR text; all static wording lives in the
+    agent instructions, so the cached prompt prefix extends right up to the
+    variable text.
     
     Args:
         ocr_text: The raw OCR text to structure
-        source_file: Optional path to the source file for metadata
-        project_client: Optional existing AIProjectClient
-        agent: Optional existing agent to reuse
         
     Returns:
-        Structured JSON dictionary containing extracted text information
+        User message string
     """
-    try:
-        logger.info(f"Processing OCR text from: {source_file or 'unknown source'}")
+    return f"""---OCR TEXT START---
+{ocr_text}
+---OCR TEXT END---"""
+
+
+def _get_or_create_agent(project_client: AIProjectClient, model: str = None):
+    """
+    Get the OCR Text Extraction Agent, creating its version only once per process.
+    
+    Agents are cached by model deployment and instructions, so a new version is
+    only registered when either of them changes. The fast model gets its own
+    agent name so both agents can be referenced side by side.
+    
+    Args:
+        project_client: AIProjectClient used to create the agent on a cache miss
+        model: Model deployment to use (defaults to model_deployment_name)
         
-        # Create client if not provided
-        should_close_client = False
-        if project_client is None:
-            logger.info("Creating AI Project Client...")
-            project_client = AIProjectClient(
-                endpoint=project_endpoint,
-                credential=DefaultAzureCredential(),
-            )
-            should_close_client = True
-        
-        # Get agent instructions for pure OCR text extraction
-        agent_instructions = get_agent_instructions()
-        
-        # Create the agent
-        agent = project_client.agents.create_version(
-            agent_name="OCRTextExtractionAgent",
-            definition=PromptAgentDefinition(
-                model=model_deployment_name,
-                instructions=agent_instructions,
-                temperature=0.1,  # Low temperature for consistent, factual extraction
-            ),
-        )
+    Returns:
+        The cached or newly created agent version
+    """
+    model = model or model_deployment_name
+    is_fast = model != model_deployment_name
+    agent_instructions = get_agent_instructions(few_shot=is_fast)
+    cache_key = (model, _INSTRUCTIONS_DIGESTS[is_fast])
+    
+    agent = _agent_cache.get(cache_key)
+    if agent is None:
+        with _agent_cache_lock:
+            agent = _agent_cache.get(cache_key)
+            if agent is None:
+                agent = project_client.agents.create_version(
+                    agent_name=FAST_AGENT_NAME if is_fast else AGENT_NAME,
+                    definition=PromptAgentDefinition(
+                        model=model,
+                        instructions=agent_instructions,
+                        temperature=0.1,  # Low temperature for consistent, factual extraction
+                    ),
+                )
+                logger.info(f"✅ Created OCR Text Extraction Agent: {agent.name} (version {agent.version})")
+                _agent_cache[cache_key] = agent
+    return agent
+
+
+class _JsonObjectScanner:
+    """
+    Incrementally locate the first balanced JSON object in (streamed) text.
+    
+    Tracks brace depth in a single pass over each chunk, ignoring braces
+    inside string literals, so markdown fences or prose around the JSON
+    are tolerated and the object is known to be complete as soon as its
+    closing brace arrives.
+    """
+    
+    def __init__(self):
+        self._prefix = []
+        self._parts = []
+        self._depth = 0
+        self._in_str = False
+        self._escaped = False
+        self.started = False
+        self.complete = False
+    
+    def feed(self, chunk: str) -> bool:
+        """
+        Consume the next chunk of text.
+        
+        Args:
+            chunk: Next piece of the model response
+            
+        Returns:
+            True once the first JSON object has been closed
+        """
+        if self.complete:
+            return True
         
-        logger.info(f"✅ Created OCR Text Extraction Agent: {agent.name} (version {agent.version})")
+        start = 0
+        if not self.started:
+            start = chunk.find("{")
+            if start == -1:
+                self._prefix.append(chunk)
+                return False
+            self.started = True
         
-        # Get OpenAI client for responses
-        openai_client = project_client.get_openai_client()
+        for i in range(start, len(chunk)):
+            ch = chunk[i]
+            if self._in_str:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[start:i + 1])
+                    self.complete = True
+                    return True
         
-        # Create user query with OCR text
-        user_query = f"""Please extract and structure all text from the following OCR output into the standardized JSON format.
+        self._parts.append(chunk[start:])
+        return False
+    
+    @property
+    def text(self) -> str:
+        """The JSON object found so far (possibly unbalanced), or the stripped text if none."""
+        if not self.started:
+            return "".join(self._prefix).strip()
+        return "".join(self._parts)
+
+
+def _response_cache_key(ocr_text: str) -> str:
+    """
+    Build the extraction cache key for an OCR text.
+    
+    Args:
+        ocr_text: The raw OCR text to structure
+        
+    Returns:
+        Hex digest over the model deployments, agent instructions and OCR text
+    """
+    hasher = hashlib.sha256()
+    hasher.update(model_deployment_name.encode())
+    hasher.update(b"\x00")
+    hasher.update((fast_model_deployment_name or "").encode())
+    hasher.update(b"\x00")
+    hasher.update(AGENT_INSTRUCTIONS_BYTES)
+    hasher.update(b"\x00")
+    hasher.update(ocr_text.encode())
+    return hasher.hexdigest()
 
----OCR TEXT START---
-{ocr_text}
----OCR TEXT END---
 
-Return only the structured JSON object with all extracted text."""
+class AgentResponseError(Exception):
+    """A streamed agent response that the service reported as failed."""
+    
+    # Error codes of server-side failures that may succeed on a later attempt
+    TRANSIENT_CODES = frozenset({"server_error", "rate_limit_exceeded"})
+    
+    def __init__(self, code: str, message: str):
+        super().__init__(f"Agent response failed ({code}): {message}")
+        self.code = code
+        self.message = message
+
+
+def _is_retryable_error(exc: BaseException) -> bool:
+    """
+    Decide whether a failed agent call is transient and worth retrying.
+    
+    Args:
+        exc: Exception raised by the call
         
-        logger.info("Sending OCR text to extraction agent...")
+    Returns:
+        True for rate limiting, timeouts, connection errors, 5xx responses and
+        transient server-side response failures
+    """
+    if isinstance(exc, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(exc, AgentResponseError):
+        return exc.code in AgentResponseError.TRANSIENT_CODES
+    return isinstance(exc, APIStatusError) and (exc.status_code == 429 or exc.status_code >= 500)
+
+
+def _log_retry(retry_state) -> None:
+    """Log a failed agent call before tenacity sleeps and retries it."""
+    logger.warning(
+        f"Extraction agent call failed (attempt {retry_state.attempt_number}): "
+        f"{retry_state.outcome.exception()}. Retrying in {retry_state.next_action.sleep:.1f}s..."
+    )
+
+
+# Only transient API errors are retried; a response that is not valid JSON is a
+# prompt problem and surfaces to the caller instead
+@retry(
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception(_is_retryable_error),
+    before_sleep=_log_retry,
+    reraise=True,
+)
+def _call_agent(openai_client, agent, user_query: str) -> tuple:
+    """
+    Send the user query to the extraction agent and stream back its JSON object.
+    
+    The response is streamed and scanned as it arrives. Once the JSON object
+    is closed, the stream is only read on to pick up token usage from the
+    final event; any further text (trailing whitespace or fences) releases
+    the stream immediately.
+    
+    Args:
+        openai_client: OpenAI client from the AI Project Client
+        agent: Extraction agent version to reference
+        user_query: User message for the agent
         
-        # Get response from agent
-        response = openai_client.responses.create(
-            input=user_query,
-            extra_body={"agent": {"name": agent.name, "type": "agent_reference"}},
-        )
+    Returns:
+        Tuple of (JSON object text, token usage dict or None if not reported)
+    """
+    scanner = _JsonObjectScanner()
+    usage = None
+    prompt_cache_key = _PROMPT_CACHE_KEYS.get(agent.name, agent.name)
+    
+    # Get response from agent in JSON mode so it returns a single valid JSON object,
+    # with output capped so a misbehaving completion cannot decode unbounded
+    stream = openai_client.responses.create(
+        input=user_query,
+        text={"format": {"type": "json_object"}},
+        max_output_tokens=MAX_OUTPUT_TOKENS,
+        stream=True,
+        extra_body={
+            "agent": {"name": agent.name, "type": "agent_reference"},
+            # Route requests for the same agent to replicas holding its cached prompt prefix
+            "prompt_cache_key": prompt_cache_key,
+        },
+        extra_headers={"x-session-affinity": prompt_cache_key},
+    )
+    with stream:
+        for event in stream:
+            if event.type == "response.output_text.delta":
+                if scanner.complete:
+                    break
+                scanner.feed(event.delta)
+            elif event.type in ("response.completed", "response.incomplete"):
+                if event.response.usage is not None:
+                    usage = event.response.usage.model_dump()
+                if event.type == "response.incomplete":
+                    logger.warning(f"Extraction response incomplete: {event.response.incomplete_details}")
+                break
+            elif event.type == "response.failed":
+                error = event.response.error
+                raise AgentResponseError(
+                    getattr(error, "code", None) or "unknown", getattr(error, "message", None) or str(error)
+                )
+            elif event.type == "error":
+                raise AgentResponseError(event.code or "unknown", event.message)
+    
+    return scanner.text, usage
+
+
+def _finalize_result(structured_data: dict, ocr_text: str, source_file: str, agent_model: str,
+                     token_usage: dict, timestamp: str) -> dict:
+    """
+    Attach the locally known fields to a parsed agent answer.
+    
+    Args:
+        structured_data: Parsed agent output, updated in place
+        ocr_text: The OCR text the answer was produced from
+        source_file: Path to the source file, if known
+        agent_model: Model deployment that produced the answer
+        token_usage: Token usage reported for the call, if any
+        timestamp: Processing timestamp for the metadata
         
-        # Extract the JSON from response
-        response_text = response.output_text.strip()
-        
-        # Try to parse the response as JSON
-        # Remove markdown code fences if present
-        if response_text.startswith("```"):
-            # Find first { and last }
-            start_idx = response_text.find("{")
-            end_idx = response_text.rfind("}")
-            if start_idx != -1 and end_idx != -1:
-                response_text = response_text[start_idx:end_idx+1]
-        
-        structured_data = json.loads(response_text)
-        
-        # Add metadata
-        structured_data["metadata"] = {
-            "source_file": source_file or "unknown",
-            "processing_timestamp": datetime.now().isoformat(),
-            "agent_model": model_deployment_name,
-            "original_text_length": len(ocr_text)
-        }
+    Returns:
+        The same structured_data dictionary
+    """
+    # Re-attach the raw text locally rather than paying output tokens to echo it
+    extracted_text = structured_data.get("extracted_text")
+    if not isinstance(extracted_text, dict):
+        extracted_text = structured_data["extracted_text"] = {}
+    extracted_text["raw_text"] = ocr_text
+    
+    # Add metadata
+    structured_data["metadata"] = {
+        "source_file": source_file or "unknown",
+        "processing_timestamp": timestamp,
+        "agent_model": agent_model,
+        "original_text_length": len(ocr_text),
+        # Tokens spent on this call (None for cache hits), for right-sizing the output cap
+        "token_usage": token_usage,
+    }
+    return structured_data
+
+
+def structure_ocr_to_json(ocr_text: str, source_file: str = None, project_client=None, agent=None,
+                          use_fast_model: bool = True) -> dict:
+    """
+    Convert OCR text into structured JSON format using GPT-4o-mini agent.
+    
+    When EXTRACTION_MODEL_FAST is configured, the fast model is tried first and
+    its answer is kept unless it is unparsable or reports low confidence.
+    
+    Args:
+        ocr_text: The raw OCR text to structure
+        source_file: Optional path to the source file for metadata
+        project_client: Optional existing AIProjectClient
+        agent: Optional existing agent to reuse (skips the fast model and the response cache)
+        use_fast_model: Try the fast model first if one is configured
+        
+    Returns:
+        Structured JSON dictionary containing extracted text information
+    """
+    # One timestamp per request, shared by the result and error paths
+    started = _now_iso()
+    try:
+        logger.info(f"Processing OCR text from: {source_file or 'unknown source'}")
+        
+        # Return the cached result for identical OCR text without calling the agent. The key
+        # only covers the default agents, so a caller-provided agent bypasses the cache
+        response_cache = _response_cache if agent is None else None
+        cache_key = _response_cache_key(ocr_text)
+        structured_data = response_cache.get(cache_key) if response_cache is not None else None
+        agent_model = model_deployment_name
+        token_usage = None
+        
+        if structured_data is not None:
+            logger.info("✓ Using cached extraction result")
+            agent_model = structured_data.pop("_agent_model", agent_model)
+        else:
+            # Reuse the shared client if none was provided
+            if project_client is None:
+                project_client = _get_project_client()
+            
+            # Get OpenAI client for responses
+            openai_client = _get_openai_client(project_client)
+            
+            # Create user query with OCR text
+            user_query = build_user_query(ocr_text)
+            
+            # Cascade: try the fast model first, keep its answer if it is confident
+            if agent is None and use_fast_model and fast_model_deployment_name:
+                logger.info(f"Sending OCR text to fast extraction agent ({fast_model_deployment_name})...")
+                try:
+                    fast_agent = _get_or_create_agent(project_client, fast_model_deployment_name)
+                    response_text, token_usage = _call_agent(openai_client, fast_agent, user_query)
+                    structured_data = orjson.loads(response_text)
+                except orjson.JSONDecodeError as e:
+                    logger.warning(f"Fast model returned invalid JSON, falling back: {e}")
+                except (APIError, HttpResponseError, AgentResponseError) as e:
+                    # Missing deployment, rejected request or retries exhausted: the main model may still answer
+                    logger.warning(f"Fast model call failed, falling back: {e}")
+                    structured_data = token_usage = None
+                else:
+                    if structured_data.get("confidence") == "low":
+                        logger.info("Fast model reported low confidence, falling back")
+                        structured_data = None
+                    else:
+                        agent_model = fast_model_deployment_name
+            
+            if structured_data is None:
+                # Reuse the provided agent, or the one created earlier in this process
+                if agent is None:
+                    agent = _get_or_create_agent(project_client)
+                
+                logger.info("Sending OCR text to extraction agent...")
+                
+                # Stream the agent response, stopping as soon as the JSON object is complete
+                response_text, token_usage = _call_agent(openai_client, agent, user_query)
+                
+                structured_data = orjson.loads(response_text)
+            
+            # Cache without metadata (regenerated per call); don't pin low-confidence answers
+            if response_cache is not None and structured_data.get("confidence") != "low":
+                response_cache.set(cache_key, {**structured_data, "_agent_model": agent_model})
+        
+        _finalize_result(structured_data, ocr_text, source_file, agent_model, token_usage, started)
         
         logger.info("✓ Successfully extracted and structured OCR text into JSON")
         return structured_data
         
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error(f"Failed to parse agent response as JSON: {e}")
         # Return error structure
         return {
@@ -191,7 +664,7 @@ Return only the structured JSON object with all extracted text."""
             "raw_response": response_text if 'response_text' in locals() else "No response",
             "metadata": {
                 "source_file": source_file or "unknown",
-                "processing_timestamp": datetime.now().isoformat(),
+                "processing_timestamp": started,
                 "agent_model": model_deployment_name
             }
         }
@@ -203,24 +676,168 @@ Return only the structured JSON object with all extracted text."""
             "error_details": str(e),
             "metadata": {
                 "source_file": source_file or "unknown",
-                "processing_timestamp": datetime.now().isoformat()
+                "processing_timestamp": started
             }
         }
 
 
-def process_ocr_result(ocr_result_json: str) -> dict:
+def _batch_request_line(custom_id: str, ocr_text: str) -> bytes:
     """
-    Process an OCR result JSON string and structure its text content.
+    Build one Batch API request line for an OCR text.
+    
+    Batch jobs cannot reference an agent, so the request carries the same
+    instructions, output format and limits as the online agent explicitly.
     
     Args:
-        ocr_result_json: JSON string from OCR agent output
+        custom_id: Identifier echoed back in the batch output
+        ocr_text: The raw OCR text to structure
+        
+    Returns:
+        JSONL line (including the trailing newline)
+    """
+    return orjson.dumps({
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/responses",
+        "body": {
+            "model": batch_model_deployment_name,
+            "instructions": AGENT_INSTRUCTIONS,
+            "input": build_user_query(ocr_text),
+            "text": {"format": {"type": "json_object"}},
+            "temperature": 0.1,
+            "max_output_tokens": MAX_OUTPUT_TOKENS,
+            "prompt_cache_key": _PROMPT_CACHE_KEYS[AGENT_NAME],
+        },
+    }) + b"\n"
+
+
+def _batch_output_text(body: dict) -> str:
+    """Concatenate the output_text parts of a Responses API body."""
+    return "".join(
+        part.get("text", "")
+        for item in body.get("output", [])
+        if item.get("type") == "message"
+        for part in item.get("content", [])
+        if part.get("type") == "output_text"
+    )
+
+
+def structure_ocr_batch(ocr_items: list[tuple[str, str]]) -> list[dict]:
+    """
+    Structure many OCR texts through the Batch API (offline, ~half the token cost).
+    
+    Submits one batch job, polls until it finishes (which may take minutes to
+    hours) and returns results in the same shape as structure_ocr_to_json.
+    Meant for backfills and reprocessing, not interactive requests.
+    
+    Args:
+        ocr_items: (ocr_text, source_file) pairs
+        
+    Returns:
+        Structured JSON dictionaries, in the same order as ocr_items
+    """
+    if not ocr_items:
+        return []
+    
+    started = _now_iso()
+    # The batch calls have no tenacity wrapper, so they keep the SDK's own retries
+    openai_client = _get_openai_client().with_options(max_retries=2)
+    
+    # Write the request file and upload it for the batch job
+    fd, batch_path = tempfile.mkstemp(prefix="extraction_batch_", suffix=".jsonl")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.writelines(_batch_request_line(str(i), text) for i, (text, _) in enumerate(ocr_items))
+        with open(batch_path, "rb") as f:
+            batch_file = openai_client.files.create(file=f, purpose="batch")
+    finally:
+        os.remove(batch_path)
+    
+    batch = openai_client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/responses",
+        completion_window="24h",
+    )
+    logger.info(f"Submitted extraction batch {batch.id} with {len(ocr_items)} request(s)")
+    
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(BATCH_POLL_INTERVAL)
+        batch = openai_client.batches.retrieve(batch.id)
+        logger.info(f"Extraction batch {batch.id}: {batch.status}")
+    
+    # Successful requests land in the output file, failed ones in the error file
+    lines = []
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if file_id:
+            lines.extend(openai_client.files.content(file_id).content.splitlines())
+    
+    results = [None] * len(ocr_items)
+    for line in lines:
+        if not line.strip():
+            continue
+        record = orjson.loads(line)
+        index = int(record["custom_id"])
+        ocr_text, source_file = ocr_items[index]
+        response = record.get("response") or {}
+        body = response.get("body") or {}
+        
+        if record.get("error") or response.get("status_code") != 200:
+            error = record.get("error") or body.get("error") or {}
+            results[index] = {
+                "error": "Processing failed",
+                "error_details": error.get("message", str(error)) if isinstance(error, dict) else str(error),
+                "metadata": {"source_file": source_file or "unknown", "processing_timestamp": started},
+            }
+            continue
+        
+        response_text = _batch_output_text(body)
+        try:
+            structured_data = orjson.loads(response_text)
+        except orjson.JSONDecodeError as e:
+            results[index] = {
+                "error": "JSON parsing failed",
+                "error_details": str(e),
+                "raw_response": response_text,
+                "metadata": {
+                    "source_file": source_file or "unknown",
+                    "processing_timestamp": started,
+                    "agent_model": batch_model_deployment_name,
+                },
+            }
+            continue
+        results[index] = _finalize_result(
+            structured_data, ocr_text, source_file, batch_model_deployment_name, body.get("usage"), started
+        )
+    
+    # Requests missing from both files (e.g. the batch expired or was cancelled)
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = {
+                "error": "Processing failed",
+                "error_details": f"Batch {batch.id} ended with status '{batch.status}' before this request completed",
+                "metadata": {"source_file": ocr_items[index][1] or "unknown", "processing_timestamp": started},
+            }
+    
+    logger.info(f"✓ Extraction batch {batch.id} finished: {batch.status}")
+    return results
+
+
+def process_ocr_result(ocr_data: dict | str, project_client=None, agent=None) -> dict:
+    """
+    Process an OCR result and structure its text content.
+    
+    Args:
+        ocr_data: OCR agent output, either already parsed or as a JSON string
+        project_client: Optional existing AIProjectClient
+        agent: Optional existing agent to reuse
         
     Returns:
         Structured JSON dictionary
     """
     try:
-        # Parse OCR result
-        ocr_data = json.loads(ocr_result_json)
+        # Parse OCR result unless the caller already did
+        if isinstance(ocr_data, (str, bytes)):
+            ocr_data = orjson.loads(ocr_data)
         
         if ocr_data.get("status") != "success":
             return {
@@ -228,7 +845,7 @@ def process_ocr_result(ocr_result_json: str) -> dict:
                 "ocr_error": ocr_data.get("error", "Unknown error"),
                 "metadata": {
                     "source_file": ocr_data.get("file_path", "unknown"),
-                    "processing_timestamp": datetime.now().isoformat()
+                    "processing_timestamp": _now_iso()
                 }
             }
         
@@ -241,24 +858,54 @@ def process_ocr_result(ocr_result_json: str) -> dict:
                 "error": "No text extracted from OCR",
                 "metadata": {
                     "source_file": source_file or "unknown",
-                    "processing_timestamp": datetime.now().isoformat()
+                    "processing_timestamp": _now_iso()
                 }
             }
         
         # Structure the OCR text
-        return structure_ocr_to_json(ocr_text, source_file)
+        return structure_ocr_to_json(ocr_text, source_file, project_client, agent)
         
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         return {
             "error": "Invalid OCR result JSON",
             "error_details": str(e),
             "metadata": {
-                "processing_timestamp": datetime.now().isoformat()
+                "processing_timestamp": _now_iso()
             }
         }
 
 
-def main():
+def process_ocr_result_from_str(ocr_result_json: str, project_client=None, agent=None) -> dict:
+    """
+    Process an OCR result JSON string and structure its text content.
+    
+    Kept for callers that hold the raw OCR agent output; equivalent to
+    process_ocr_result() with a string argument.
+    
+    Args:
+        ocr_result_json: JSON string from OCR agent output
+        project_client: Optional existing AIProjectClient
+        agent: Optional existing agent to reuse
+        
+    Returns:
+        Structured JSON dictionary
+    """
+    return process_ocr_result(ocr_result_json, project_client, agent)
+
+
+def _read_file_bytes(path: str) -> bytes:
+    """Read a whole file as bytes (run via asyncio.to_thread)."""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write_file_bytes(path: str, data: bytes) -> None:
+    """Write bytes to a file, replacing it (run via asyncio.to_thread)."""
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+async def main():
     """Main function to create and test the JSON Structuring Agent."""
     
     print("=== JSON Structuring Agent with GPT-4o-mini ===\n")
@@ -281,127 +928,69 @@ def main():
         
         print(f"📄 Processing file: {input_file}\n")
         
-        # Create AI Project Client
-        project_client = AIProjectClient(
-            endpoint=project_endpoint,
-            credential=DefaultAzureCredential(),
-        )
+        # Read input file off the event loop
+        file_content = await asyncio.to_thread(_read_file_bytes, input_file)
         
-        with project_client:
-            # Generate agent instructions for OCR text extraction
-            agent_instructions = get_agent_instructions()
-            
-            # Create the agent
-            agent = project_client.agents.create_version(
-                agent_name="OCRTextExtractionAgent",
-                definition=PromptAgentDefinition(
-                    model=model_deployment_name,
-                    instructions=agent_instructions,
-                    temperature=0.1,
-                ),
-            )
-            
-            print(f"✅ Created OCR Text Extraction Agent: {agent.name} (version {agent.version})")
-            print(f"   Agent visible in Foundry portal\n")
-            
-            # Read input file
-            with open(input_file, 'r') as f:
-                file_content = f.read()
-            
-            # Check if it's OCR JSON result or raw text
-            is_ocr_json = False
-            ocr_text = ""
-            source_file = input_file
-            
-            try:
-                # Try to parse as JSON (OCR result)
-                ocr_data = json.loads(file_content)
-                if "text" in ocr_data and "status" in ocr_data:
-                    is_ocr_json = True
-                    if ocr_data.get("status") == "success":
-                        ocr_text = ocr_data.get("text", "")
-                        source_file = ocr_data.get("file_path", input_file)
-                    else:
-                        print(f"❌ OCR failed: {ocr_data.get('error', 'Unknown error')}")
-                        return
+        # Check if it's OCR JSON result or raw text
+        is_ocr_json = False
+        ocr_text = ""
+        source_file = input_file
+        
+        try:
+            # Try to parse as JSON (OCR result)
+            ocr_data = orjson.loads(file_content)
+            if "text" in ocr_data and "status" in ocr_data:
+                is_ocr_json = True
+                if ocr_data.get("status") == "success":
+                    ocr_text = ocr_data.get("text", "")
+                    source_file = ocr_data.get("file_path", input_file)
                 else:
-                    # JSON but not OCR format, treat as raw text
-                    ocr_text = file_content
-            except json.JSONDecodeError:
-                # Not JSON, treat as raw text
-                ocr_text = file_content
-            
-            print(f"   Type: {'OCR JSON result' if is_ocr_json else 'Raw text'}")
-            print(f"   Text length: {len(ocr_text)} characters\n")
-            
-            # Get OpenAI client
-            openai_client = project_client.get_openai_client()
-            
-            # Create user query
-            user_query = f"""Please extract and structure all text from the following OCR output into the standardized JSON format.
-
----OCR TEXT START---
-{ocr_text}
----OCR TEXT END---
-
-Return only the structured JSON object with all extracted text."""
-            
-            print("🤖 Sending to agent for text extraction...")
-            
-            # Get response from agent
-            response = openai_client.responses.create(
-                input=user_query,
-                extra_body={"agent": {"name": agent.name, "type": "agent_reference"}},
-            )
-            
-            # Extract and parse response
-            response_text = response.output_text.strip()
-            
-            # Remove markdown code fences if present
-            if response_text.startswith("```"):
-                start_idx = response_text.find("{")
-                end_idx = response_text.rfind("}")
-                if start_idx != -1 and end_idx != -1:
-                    response_text = response_text[start_idx:end_idx+1]
-            
-            try:
-                result = json.loads(response_text)
-                
-                # Add metadata
-                result["metadata"] = {
-                    "source_file": source_file,
-                    "processing_timestamp": datetime.now().isoformat(),
-                    "agent_model": model_deployment_name,
-                    "original_text_length": len(ocr_text)
-                }
-                
-                # Output results
-                print("\n=== Structured JSON Output ===")
-                print(json.dumps(result, indent=2))
-                
-                # Save to output file
-                output_file = input_file.rsplit('.', 1)[0] + '_structured.json'
-                with open(output_file, 'w') as f:
-                    json.dump(result, f, indent=2)
-                
-                print(f"\n✓ Structured JSON saved to: {output_file}")
-                
-                # Summary
-                print(f"\n📊 Summary:")
-                print(f"   Document type: {result.get('document_type', 'unknown')}")
-                print(f"   Vehicle side: {result.get('vehicle_side', 'unspecified')}")
-                print(f"   Confidence: {result.get('confidence', 'unknown')}")
-                
-                if result.get('extracted_data', {}).get('policy_holder', {}).get('name'):
-                    print(f"   Policy holder: {result['extracted_data']['policy_holder']['name']}")
-                if result.get('extracted_data', {}).get('damages', {}).get('estimated_amount'):
-                    print(f"   Estimated amount: ${result['extracted_data']['damages']['estimated_amount']}")
-                
-                print("\n✓ JSON Structuring Agent completed successfully!")
-                
-            except json.JSONDecodeError as e:
-                print(f"\n❌ Failed to parse agent response as JSON: {e}")
-                print(f"Raw response:\n{response_text}")
+                    print(f"❌ OCR failed: {ocr_data.get('error', 'Unknown error')}")
+                    return
+            else:
+                # JSON but not OCR format, treat as raw text
+                ocr_text = file_content.decode()
+        except orjson.JSONDecodeError:
+            # Not JSON, treat as raw text
+            ocr_text = file_content.decode()
+        
+        print(f"   Type: {'OCR JSON result' if is_ocr_json else 'Raw text'}")
+        print(f"   Text length: {len(ocr_text)} characters\n")
+        
+        print("🤖 Sending to agent for text extraction...")
+        
+        # Same path as library callers: shared client and agent, cache, cascade and retries
+        result = await asyncio.to_thread(structure_ocr_to_json, ocr_text, source_file)
+        
+        if "error" in result:
+            print(f"\n❌ {result['error']}: {result.get('error_details', '')}")
+            if "raw_response" in result:
+                print(f"Raw response:\n{result['raw_response']}")
+            return
+        
+        # Output results
+        output_json = orjson.dumps(result, option=orjson.OPT_INDENT_2)
+        print("\n=== Structured JSON Output ===")
+        print(output_json.decode())
+        
+        # Save to output file
+        output_file = input_file.rsplit('.', 1)[0] + '_structured.json'
+        await asyncio.to_thread(_write_file_bytes, output_file, output_json)
+        
+        print(f"\n✓ Structured JSON saved to: {output_file}")
+        
+        # Summary
+        print(f"\n📊 Summary:")
+        print(f"   Document type: {result.get('document_type', 'unknown')}")
+        print(f"   Vehicle side: {result.get('vehicle_side', 'unspecified')}")
+        print(f"   Confidence: {result.get('confidence', 'unknown')}")
+        
+        if result.get('extracted_data', {}).get('policy_holder', {}).get('name'):
+            print(f"   Policy holder: {result['extracted_data']['policy_holder']['name']}")
+        if result.get('extracted_data', {}).get('damages', {}).get('estimated_amount'):
+            print(f"   Estimated amount: ${result['extracted_data']['damages']['estimated_amount']}")
+        
+        print("\n✓ JSON Structuring Agent completed successfully!")
         
     except Exception as e:
         logger.error(f"❌ Error: {e}")
@@ -411,4 +1000,4 @@ Return only the structured JSON object with all extracted text."""
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -11,6 +11,7 @@ Example:
 """
 import os
 import sys
+import atexit
 import base64
 import json
 import logging
@@ -35,6 +36,14 @@ logger = logging.getLogger(__name__)
 project_endpoint = os.environ.get("AI_FOUNDRY_PROJECT_ENDPOINT")
 model_deployment_name = os.environ.get("MODEL_DEPLOYMENT_NAME")
 
+# Shared HTTP client for Mistral Document AI calls; keeping connections alive
+# avoids a fresh TCP/TLS handshake per document
+_http_client = httpx.Client(
+    timeout=httpx.Timeout(300.0, connect=5.0),
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+)
+atexit.register(_http_client.close)
+
 
 def encode_file_to_base64(file_path: str) -> tuple[str, str]:
     """
@@ -126,53 +135,52 @@ def extract_text_with_ocr(image_path: str) -> str:
         
         logger.info(f"Submitting to Mistral Document AI: {endpoint}")
         
-        # Make API call
-        with httpx.Client(timeout=300.0) as client:
-            response = client.post(endpoint, json=payload, headers=headers)
-            response.raise_for_status()
-            
-            result = response.json()
-            logger.info(f"Received response from Mistral Document AI")
-            
-            # Extract text from response
+        # Make API call over the shared, keep-alive client
+        response = _http_client.post(endpoint, json=payload, headers=headers)
+        response.raise_for_status()
+        
+        result = response.json()
+        logger.info(f"Received response from Mistral Document AI")
+        
+        # Extract text from response
+        ocr_text = ""
+        pages_count = 0
+        
+        if "pages" in result and isinstance(result["pages"], list):
+            # Extract markdown from pages (standard Mistral DocAI format)
+            markdown_parts = []
+            for page in result["pages"]:
+                if isinstance(page, dict) and "markdown" in page:
+                    markdown_parts.append(page["markdown"])
+            ocr_text = "\n\n".join(markdown_parts)
+            pages_count = len(result["pages"])
+            logger.info(f"Extracted markdown from {pages_count} page(s)")
+        elif "content" in result:
+            ocr_text = result["content"]
+        elif "text" in result:
+            ocr_text = result["text"]
+        elif "choices" in result and len(result["choices"]) > 0:
+            # Fallback: OpenAI format
+            ocr_text = result["choices"][0].get("message", {}).get("content", "")
+        else:
+            logger.warning(f"Unexpected response format from Mistral API")
             ocr_text = ""
-            pages_count = 0
-            
-            if "pages" in result and isinstance(result["pages"], list):
-                # Extract markdown from pages (standard Mistral DocAI format)
-                markdown_parts = []
-                for page in result["pages"]:
-                    if isinstance(page, dict) and "markdown" in page:
-                        markdown_parts.append(page["markdown"])
-                ocr_text = "\n\n".join(markdown_parts)
-                pages_count = len(result["pages"])
-                logger.info(f"Extracted markdown from {pages_count} page(s)")
-            elif "content" in result:
-                ocr_text = result["content"]
-            elif "text" in result:
-                ocr_text = result["text"]
-            elif "choices" in result and len(result["choices"]) > 0:
-                # Fallback: OpenAI format
-                ocr_text = result["choices"][0].get("message", {}).get("content", "")
-            else:
-                logger.warning(f"Unexpected response format from Mistral API")
-                ocr_text = ""
-            
-            # Build success response
-            success_result = {
-                "status": "success",
-                "text": ocr_text,
-                "file_path": image_path,
-                "file_name": os.path.basename(image_path),
-                "character_count": len(ocr_text),
-                "pages_processed": pages_count if pages_count > 0 else 1,
-                "model_used": mistral_model,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            logger.info(f"OCR completed: {len(ocr_text)} characters extracted from {image_path}")
-            return json.dumps(success_result)
-            
+        
+        # Build success response
+        success_result = {
+            "status": "success",
+            "text": ocr_text,
+            "file_path": image_path,
+            "file_name": os.path.basename(image_path),
+            "character_count": len(ocr_text),
+            "pages_processed": pages_count if pages_count > 0 else 1,
+            "model_used": mistral_model,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+        logger.info(f"OCR completed: {len(ocr_text)} characters extracted from {image_path}")
+        return json.dumps(success_result)
+        
     except httpx.HTTPStatusError as e:
         error_msg = f"HTTP Error {e.response.status_code}: {e.response.text[:500]}"
         logger.error(f"Mistral API HTTP error: {error_msg}")
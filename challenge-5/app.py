@@ -3,15 +3,26 @@
 Claims Processing UI
 Streamlit frontend for the Claims Processing REST API
 """
+import io
 import os
 import json
+import time
 import base64
+import hashlib
 import httpx
+import orjson
 import streamlit as st
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from PIL import Image, ImageOps
 
-# Load environment variables
-load_dotenv("/workspaces/claims-processing-hack/.env")
+# Custom CSS
+CUSTOM_CSS = """<style>
+.main-header{font-size:2.5rem;font-weight:bold;color:#1E3A8A;margin-bottom:1rem}
+.status-success{background-color:#D1FAE5;padding:1rem;border-radius:.5rem;border-left:4px solid #10B981}
+.status-error{background-color:#FEE2E2;padding:1rem;border-radius:.5rem;border-left:4px solid #EF4444}
+</style>"""
 
 # Page configuration
 st.set_page_config(
@@ -21,79 +32,188 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS
-st.markdown("""
-<style>
-    .main-header { font-size: 2.5rem; font-weight: bold; color: #1E3A8A; margin-bottom: 1rem; }
-    .status-success { background-color: #D1FAE5; padding: 1rem; border-radius: 0.5rem; border-left: 4px solid #10B981; }
-    .status-error { background-color: #FEE2E2; padding: 1rem; border-radius: 0.5rem; border-left: 4px solid #EF4444; }
-</style>
-""", unsafe_allow_html=True)
+# Emitted on every run: Streamlit drops elements a rerun doesn't render, so the styles
+# would vanish after the first interaction if this were skipped
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+# Uploads with a longer edge are downscaled before sending; OCR does not need more detail
+MAX_UPLOAD_EDGE = 2048
+
+# Raw JSON larger than this is shown truncated, with a download for the full body
+RAW_JSON_PREVIEW_BYTES = 200_000
+
+# Processed claims kept per session for instant re-clicks (each holds the parsed result and raw body)
+CLAIM_CACHE_SIZE = 4
+
+# Severity -> indicator shown on the damage assessment card
+SEVERITY_ICONS = {"minor": "🟢", "moderate": "🟡", "severe": "🔴"}
 
 # Default API URL - Container Apps direct URL
 DEFAULT_API_URL = "https://claims-processing-api.orangeforest-dfe25231.swedencentral.azurecontainerapps.io"
 
 
+# Streamlit re-executes this script on every interaction; parse .env once per process
+@st.cache_resource(show_spinner=False)
+def load_environment() -> str:
+    load_dotenv("/workspaces/claims-processing-hack/.env")
+    return os.environ.get("API_URL", DEFAULT_API_URL)
+
+
+# One keep-alive HTTP/2 client per process, so repeat calls skip the TCP/TLS handshake
+# and health checks and uploads to the API share a connection. cache_resource shares it
+# across all browser sessions (httpx.Client is thread-safe), so the pool is sized for
+# concurrent uploads from several users.
+@st.cache_resource(show_spinner=False)
+def get_http_client() -> httpx.Client:
+    return httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60),
+    )
+
+
+# Worker threads for claim uploads, so the script thread stays free to refresh progress
+@st.cache_resource(show_spinner=False)
+def get_upload_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="claim-upload")
+
+
 def get_api_url():
-    if "api_url" not in st.session_state:
-        st.session_state.api_url = os.environ.get("API_URL", DEFAULT_API_URL)
-    return st.session_state.api_url
+    return st.session_state.setdefault("api_url", load_environment())
+
+
+# Reruns within the TTL reuse the last healthy response; errors raise and are not cached
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_health(api_url: str) -> dict:
+    response = get_http_client().get(f"{api_url}/health", timeout=10.0)
+    return orjson.loads(response.content)
 
 
 def check_health(api_url: str) -> dict:
     try:
-        with httpx.Client(timeout=10.0) as client:
-            response = client.get(f"{api_url}/health")
-            return response.json()
+        return fetch_health(api_url)
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
 
-def process_claim(api_url: str, file_content: bytes, filename: str) -> dict:
+# Open the pooled connection to the API in the background, once per session and URL
+def warm_up_connection(api_url: str):
+    if st.session_state.get("warmed_api_url") == api_url:
+        return
+    st.session_state.warmed_api_url = api_url
+    # Fire-and-forget: the response is discarded, only the TCP/TLS connection is kept
+    get_upload_executor().submit(get_http_client().get, f"{api_url}/health", timeout=10.0)
+
+
+# Returns the parsed response and its raw body, so the raw JSON view needs no re-serialization
+# Pass client when calling from a worker thread, where Streamlit caches are unavailable
+def process_claim(api_url: str, uploaded_file, downscaled: bytes = None,
+                  client: httpx.Client = None) -> tuple[dict, bytes]:
     try:
-        with httpx.Client(timeout=120.0) as client:
-            files = {"file": (filename, file_content, "image/jpeg")}
-            response = client.post(f"{api_url}/process-claim/upload", files=files)
-            return response.json()
+        if downscaled is not None:
+            name = os.path.splitext(uploaded_file.name)[0] + ".jpg"
+            files = {"file": (name, downscaled, "image/jpeg")}
+        else:
+            # Hand httpx the uploaded file object so it streams it instead of copying the bytes;
+            # rewind first since the preview may have read it
+            uploaded_file.seek(0)
+            files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type or "image/jpeg")}
+        client = client or get_http_client()
+        response = client.post(f"{api_url}/process-claim/upload", files=files, timeout=120.0)
+        return orjson.loads(response.content), response.content
     except Exception as e:
-        return {"success": False, "error": str(e)}
+        return {"success": False, "error": str(e)}, b""
+
+
+def format_usd(value) -> str:
+    return f"${value:,.2f}" if isinstance(value, (int, float)) else str(value)
+
+
+def render_vehicle_info(v: dict):
+    cols = st.columns(4)
+    cols[0].metric("Make", v.get("make", "N/A"))
+    cols[1].metric("Model", v.get("model", "N/A"))
+    cols[2].metric("Color", v.get("color", "N/A"))
+    cols[3].metric("Year", v.get("year", "N/A"))
+
+
+def render_damage_assessment(d: dict):
+    cols = st.columns(3)
+    severity = d.get("severity", "N/A")
+    icon = SEVERITY_ICONS.get(str(severity).lower(), "⚪")
+    cols[0].metric("Severity", f"{icon} {severity}")
+    cols[1].metric("Estimated Cost", format_usd(d.get("estimated_cost", "N/A")))
+    areas = d.get("affected_areas", [])
+    cols[2].metric("Affected Areas", len(areas) if isinstance(areas, list) else "N/A")
+    if areas:
+        st.markdown("**Areas:** " + ", ".join(areas))
+
+
+def render_incident_info(i: dict):
+    # One element per section; "  \n" is a markdown line break within it
+    st.markdown(
+        f"**Date:** {i.get('date', 'N/A')} | **Location:** {i.get('location', 'N/A')}  \n"
+        f"**Description:** {i.get('description', 'N/A')}"
+    )
+
+
+# Result sections in display order: (data key, heading, renderer)
+RESULT_SECTIONS = (
+    ("vehicle_info", "🚗 Vehicle Information", render_vehicle_info),
+    ("damage_assessment", "💥 Damage Assessment", render_damage_assessment),
+    ("incident_info", "📋 Incident Information", render_incident_info),
+)
+RESULT_SECTION_KEYS = frozenset(key for key, _, _ in RESULT_SECTIONS)
+
+
+# Small WEBP preview instead of shipping the full upload to the browser; keyed on the
+# content digest (the leading underscore keeps the file object out of the cache hash)
+@st.cache_data(show_spinner=False, max_entries=16)
+def make_preview(file_digest: str, _uploaded_file) -> bytes:
+    _uploaded_file.seek(0)
+    with Image.open(_uploaded_file) as im:
+        im.draft("RGB", (400, 400))  # JPEG: decode at reduced scale
+        im = ImageOps.exif_transpose(im)  # keep phone photos upright once EXIF is dropped
+        im.thumbnail((400, 400))  # 2x the displayed width, for high-DPI screens
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGB")
+        out = io.BytesIO()
+        im.save(out, "WEBP", quality=70)
+    _uploaded_file.seek(0)
+    return out.getvalue()
+
+
+# JPEG no larger than MAX_UPLOAD_EDGE, or None when the upload is already small enough
+# and is sent unchanged; cached per content digest like the preview
+@st.cache_data(show_spinner=False, max_entries=8)
+def downscale_upload(file_digest: str, _uploaded_file) -> bytes | None:
+    _uploaded_file.seek(0)
+    with Image.open(_uploaded_file) as im:
+        if max(im.size) <= MAX_UPLOAD_EDGE:
+            return None
+        im.draft("RGB", (MAX_UPLOAD_EDGE, MAX_UPLOAD_EDGE))  # JPEG: decode at reduced scale
+        im = ImageOps.exif_transpose(im)  # keep phone photos upright once EXIF is dropped
+        im.thumbnail((MAX_UPLOAD_EDGE, MAX_UPLOAD_EDGE), Image.LANCZOS)
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+        out = io.BytesIO()
+        im.save(out, "JPEG", quality=85, optimize=True)
+    _uploaded_file.seek(0)
+    return out.getvalue()
 
 
 def display_results(data: dict):
-    if not data:
+    # Nothing was structured (e.g. an error payload): say so instead of emitting empty sections
+    if not data or (not data.get("document_type") and not data.get("metadata")):
+        st.info("No structured data returned.")
         return
     
-    # Vehicle Information
-    if "vehicle_info" in data:
-        st.subheader("🚗 Vehicle Information")
-        v = data["vehicle_info"]
-        cols = st.columns(4)
-        cols[0].metric("Make", v.get("make", "N/A"))
-        cols[1].metric("Model", v.get("model", "N/A"))
-        cols[2].metric("Color", v.get("color", "N/A"))
-        cols[3].metric("Year", v.get("year", "N/A"))
-    
-    # Damage Assessment
-    if "damage_assessment" in data:
-        st.subheader("💥 Damage Assessment")
-        d = data["damage_assessment"]
-        cols = st.columns(3)
-        severity = d.get("severity", "N/A")
-        icon = {"minor": "🟢", "moderate": "🟡", "severe": "🔴"}.get(str(severity).lower(), "⚪")
-        cols[0].metric("Severity", f"{icon} {severity}")
-        cost = d.get("estimated_cost", "N/A")
-        cols[1].metric("Estimated Cost", f"${cost:,.2f}" if isinstance(cost, (int, float)) else cost)
-        areas = d.get("affected_areas", [])
-        cols[2].metric("Affected Areas", len(areas) if isinstance(areas, list) else "N/A")
-        if areas:
-            st.markdown("**Areas:** " + ", ".join(areas))
-    
-    # Incident Information
-    if "incident_info" in data:
-        st.subheader("📋 Incident Information")
-        i = data["incident_info"]
-        st.markdown(f"**Date:** {i.get('date', 'N/A')} | **Location:** {i.get('location', 'N/A')}")
-        st.markdown(f"**Description:** {i.get('description', 'N/A')}")
+    # One C-level set intersection finds the sections present in the payload;
+    # sections the payload doesn't carry are skipped quietly
+    present = data.keys() & RESULT_SECTION_KEYS
+    for key, heading, render in RESULT_SECTIONS:
+        if key in present:
+            st.subheader(heading)
+            render(data[key] or {})
 
 
 def main():
@@ -103,17 +223,29 @@ def main():
     # Sidebar
     with st.sidebar:
         st.header("⚙️ Configuration")
-        api_url = st.text_input("API URL", value=get_api_url())
-        st.session_state.api_url = api_url
+        # A form reruns the script once on Apply instead of on every keystroke
+        with st.form("config_form", clear_on_submit=False):
+            api_url = st.text_input("API URL", value=get_api_url())
+            if st.form_submit_button("Apply", use_container_width=True):
+                st.session_state.api_url = api_url
+        
+        health_col, refresh_col = st.columns(2)
+        check_btn = health_col.button("🏥 Check Health", use_container_width=True)
+        refresh_btn = refresh_col.button("🔄 Force Refresh", use_container_width=True, help="Bypass the 30s health cache")
+        if refresh_btn:
+            fetch_health.clear()
         
-        if st.button("🏥 Check Health", use_container_width=True):
+        if check_btn or refresh_btn:
             with st.spinner("Checking..."):
-                result = check_health(api_url)
+                result = check_health(st.session_state.api_url)
                 if result.get("status") == "healthy":
                     st.success(f"✅ API Healthy\n\n{result.get('service', '')}")
                 else:
                     st.error(f"❌ {result.get('error', 'Error')}")
     
+    # Handshake with the API while the user is still choosing a file
+    warm_up_connection(st.session_state.api_url)
+    
     # Main content
     col1, col2 = st.columns([2, 1])
     
@@ -122,25 +254,63 @@ def main():
         uploaded = st.file_uploader("Choose image", type=["jpg", "jpeg", "png"])
         process_btn = st.button("🚀 Process Claim", type="primary", use_container_width=True, disabled=not uploaded)
     
+    # Identify the upload by content so re-processing an unchanged file needs no API call
+    file_digest = hashlib.blake2b(uploaded.getbuffer(), digest_size=16).hexdigest() if uploaded else None
+    
     with col2:
         if uploaded:
-            st.image(uploaded, caption=uploaded.name, width=200)
+            st.image(make_preview(file_digest, uploaded), caption=uploaded.name, width=200)
     
     # Process
     if process_btn and uploaded:
+        claim_cache = st.session_state.setdefault("claim_cache", OrderedDict())
+        cache_key = (st.session_state.api_url, file_digest)
+        if cache_key in claim_cache:
+            claim_cache.move_to_end(cache_key)
+            result, raw = claim_cache[cache_key]
+        else:
+            # Upload on a worker thread and keep the elapsed time ticking in the status box
+            with st.status("🔄 Processing... (30-60 seconds)", expanded=False) as status:
+                started = time.perf_counter()
+                future = get_upload_executor().submit(
+                    process_claim, st.session_state.api_url, uploaded,
+                    downscale_upload(file_digest, uploaded), get_http_client(),
+                )
+                while not future.done():
+                    status.update(label=f"🔄 Processing... {time.perf_counter() - started:.0f}s elapsed")
+                    time.sleep(0.5)
+                result, raw = future.result()
+                status.update(
+                    label=f"Finished in {time.perf_counter() - started:.0f}s",
+                    state="complete" if result.get("success") else "error",
+                )
+            # Only successes are reused; a failed attempt is retried on the next click
+            if result.get("success"):
+                claim_cache[cache_key] = (result, raw)
+                if len(claim_cache) > CLAIM_CACHE_SIZE:
+                    claim_cache.popitem(last=False)
+        # Keep the result so later reruns (health check, URL change) redraw it from memory
+        st.session_state.last_claim = {"file": file_digest, "result": result, "raw": raw}
+    
+    last_claim = st.session_state.get("last_claim")
+    if uploaded and last_claim and last_claim["file"] == file_digest:
+        result = last_claim["result"]
         st.divider()
-        with st.spinner("🔄 Processing... (30-60 seconds)"):
-            result = process_claim(st.session_state.api_url, uploaded.getvalue(), uploaded.name)
-        
         st.header("📋 Results")
         if result.get("success"):
             st.markdown('<div class="status-success">✅ Claim processed successfully!</div>', unsafe_allow_html=True)
             display_results(result.get("data", {}))
-            with st.expander("🔍 Raw JSON"):
-                st.json(result)
+            # Collapsed expanders still ship their content, so only render the JSON on demand
+            if st.toggle("🔍 Show raw JSON"):
+                raw = last_claim["raw"]
+                if len(raw) <= RAW_JSON_PREVIEW_BYTES:
+                    # A JSON string is passed to the viewer as-is, without json.dumps
+                    st.json(raw.decode())
+                else:
+                    st.code(raw[:RAW_JSON_PREVIEW_BYTES].decode(errors="ignore") + "\n…", language="json")
+                    st.download_button("⬇️ Download full JSON", raw, file_name="claim.json", mime="application/json")
         else:
             st.markdown(f'<div class="status-error">❌ Error: {result.get("error", "Unknown")}</div>', unsafe_allow_html=True)
 
-
 if __name__ == "__main__":
     main()